@@ -0,0 +1,108 @@
+"""
+Start-up time benchmark for the short command line calls.
+
+Runs each command several times in a fresh interpreter and reports the median
+wall-clock time above a bare `python -c pass`. It also checks that importing
+the scripts does not pull in the heavy dependencies (pandas, openpyxl, PIL...),
+which must only be imported by the code paths that use them.
+
+Exits with status 1 if a heavy module is imported at start-up or a command
+goes over the time budget, so it can run in CI.
+
+Usage:
+    python bench_startup.py --runs 10 --budget 0.3
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+HEAVY_MODULES = ['pandas', 'numpy', 'openpyxl', 'openpyxl_image_loader', 'PIL', 'matplotlib']
+# modules whose import must stay light
+LIGHT_MODULES = ['extract_excel_data', 'check_db', 'profiling']
+
+WORKBOOK_XML = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+          xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+  <sheets>
+    <sheet name="Hoja1" sheetId="1" r:id="rId1"/>
+    <sheet name="Hoja2" sheetId="2" r:id="rId2"/>
+  </sheets>
+</workbook>
+'''
+
+
+def make_fixtures(folder):
+    """Write a workbook (only its workbook.xml, all --listar_hojas reads) and an empty database"""
+    workbook = os.path.join(folder, 'bench.xlsx')
+    with zipfile.ZipFile(workbook, 'w') as workbook_zip:
+        workbook_zip.writestr('xl/workbook.xml', WORKBOOK_XML)
+    database = os.path.join(folder, 'bench.db')
+    sqlite3.connect(database).close()
+    return workbook, database
+
+
+def time_command(command, runs):
+    """Median wall-clock seconds of running the command in a new process"""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=REPO_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def heavy_imports(module):
+    """Heavy modules loaded by importing the given module"""
+    code = (f"import sys, {module}; "
+            f"print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+    result = subprocess.run([sys.executable, '-c', code], cwd=REPO_DIR,
+                            capture_output=True, text=True, check=True)
+    return result.stdout.split()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the start-up time of the short command line calls.')
+    parser.add_argument('--runs', type=int, default=5,
+                        help='Runs per command, the median is reported (default: 5)')
+    parser.add_argument('--budget', type=float, default=0.3,
+                        help='Maximum seconds above the bare interpreter start-up (default: 0.3)')
+    args = parser.parse_args()
+
+    failed = False
+
+    print("Heavy modules imported at start-up:")
+    for module in LIGHT_MODULES:
+        loaded = heavy_imports(module)
+        print(f"- {module}: {', '.join(loaded) if loaded else 'none'}")
+        failed |= bool(loaded)
+
+    with tempfile.TemporaryDirectory() as folder:
+        workbook, database = make_fixtures(folder)
+        commands = {
+            'extract_excel_data.py --listar_hojas': [sys.executable, 'extract_excel_data.py',
+                                                     '--archivo', workbook, '--listar_hojas'],
+            'check_db.py (empty database)': [sys.executable, 'check_db.py', database],
+            'extract_excel_data.py --help': [sys.executable, 'extract_excel_data.py', '--help'],
+        }
+
+        baseline = time_command([sys.executable, '-c', 'pass'], args.runs)
+        print(f"\nInterpreter start-up: {baseline * 1000:.0f} ms")
+        print(f"Median start-up above it ({args.runs} runs, budget {args.budget * 1000:.0f} ms):")
+        for name, command in commands.items():
+            extra = time_command(command, args.runs) - baseline
+            over = extra > args.budget
+            failed |= over
+            print(f"- {name}: {extra * 1000:.0f} ms{'  OVER BUDGET' if over else ''}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,7 @@
+import argparse
 import sqlite3
-import pandas as pd
+
+from profiling import add_profiling_arguments, profiled, stage
 
 def check_database(db_path):
     try:
@@ -31,7 +33,10 @@ def check_database(db_path):
             # Show sample data
             if count > 0:
                 print("\nSample data (first 5 rows):")
-                df = pd.read_sql_query("SELECT * FROM productos LIMIT 5", conn)
+                # pandas is only needed to print the sample, keep it out of start-up
+                import pandas as pd
+                with stage('sample query'):
+                    df = pd.read_sql_query("SELECT * FROM productos LIMIT 5", conn)
                 print(df)
         
         conn.close()
@@ -40,6 +45,12 @@ def check_database(db_path):
         print(f"Error checking database: {e}")
 
 if __name__ == "__main__":
-    db_path = "test_products.db"  # Change this to check a different database
-    print(f"Checking database: {db_path}")
-    check_database(db_path)
+    parser = argparse.ArgumentParser(description='Show the tables and a sample of the productos table')
+    parser.add_argument('db_path', nargs='?', default='test_products.db',
+                        help='Database to check (default: test_products.db)')
+    add_profiling_arguments(parser)
+    args = parser.parse_args()
+
+    print(f"Checking database: {args.db_path}")
+    with profiled(args):
+        check_database(args.db_path)
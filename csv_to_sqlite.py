@@ -5,6 +5,8 @@ import argparse
 from datetime import datetime
 import hashlib
 
+from profiling import add_profiling_arguments, profiled, stage
+
 def create_tables(conn):
     """Create the database tables with the same structure as productos_old.db"""
     cursor = conn.cursor()
@@ -144,6 +146,73 @@ def map_csv_to_products(df):
     
     return productos
 
+def bulk_load(conn, table, data, indexes=None, unique_indexes=None):
+    """
+    Append rows to a table and create its indexes once all the rows are in.
+
+    Args:
+        conn: Open sqlite3 connection
+        table (str): Name of the table (created from the first chunk if missing)
+        data: A DataFrame, or an iterable of DataFrame chunks to stream larger files
+        indexes (dict): Index name -> list of columns
+        unique_indexes (dict): Unique index name -> list of columns
+
+    Returns:
+        int: Number of rows written
+    """
+    if isinstance(data, pd.DataFrame):
+        data = [data]
+
+    row_count = 0
+    for chunk in data:
+        chunk.to_sql(table, conn, if_exists='append', index=False)
+        row_count += len(chunk)
+
+    # Create indexes after the inserts, it is faster than updating them row by row
+    with conn:
+        for unique, index_map in ((False, indexes or {}), (True, unique_indexes or {})):
+            for index_name, columns in index_map.items():
+                column_list = ', '.join(f'"{col}"' for col in columns)
+                conn.execute(
+                    f'CREATE {"UNIQUE " if unique else ""}INDEX IF NOT EXISTS {index_name} '
+                    f'ON "{table}"({column_list})'
+                )
+    return row_count
+
+PRODUCT_COLUMNS = ['codigo_barras', 'nombre', 'descripcion', 'descripcion_empaque',
+                   'color', 'cantidad', 'almacen', 'image_path']
+
+def ensure_tables(conn):
+    """Create the tables if the database is new, keeping the data of an existing one"""
+    cursor = conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='productos'")
+    if cursor.fetchone() is None:
+        create_tables(conn)
+
+def upsert_products(conn, productos):
+    """
+    Insert the products, updating the ones already stored for the same barcode and almacen.
+
+    Args:
+        conn: Open sqlite3 connection
+        productos (DataFrame): Output of map_csv_to_products
+
+    Returns:
+        int: Number of rows written
+    """
+    rows = productos.reindex(columns=PRODUCT_COLUMNS)
+    rows = rows.astype(object).where(rows.notna(), None)
+    column_list = ', '.join(PRODUCT_COLUMNS)
+    placeholders = ', '.join('?' for _ in PRODUCT_COLUMNS)
+    updates = ', '.join(f'{col} = excluded.{col}' for col in PRODUCT_COLUMNS
+                        if col not in ('codigo_barras', 'almacen'))
+    with conn:
+        conn.executemany(
+            f'INSERT INTO productos ({column_list}) VALUES ({placeholders}) '
+            f'ON CONFLICT(codigo_barras, almacen) DO UPDATE SET {updates}',
+            rows.itertuples(index=False, name=None)
+        )
+    return len(rows)
+
 def create_database(csv_file, db_name='productos.db'):
     """
     Create an SQLite database with the same structure as productos_old.db
@@ -164,7 +233,8 @@ def create_database(csv_file, db_name='productos.db'):
         
         # Read the CSV file
         print(f"Reading CSV file: {csv_file}")
-        df = pd.read_csv(csv_file)
+        with stage('read csv'):
+            df = pd.read_csv(csv_file)
         print(f"Found {len(df)} rows in CSV")
         
         # Create a connection to the SQLite database
@@ -172,11 +242,13 @@ def create_database(csv_file, db_name='productos.db'):
         
         # Create tables with the same structure as productos_old.db
         print("\nCreating database structure...")
-        create_tables(conn)
+        with stage('create tables'):
+            create_tables(conn)
         
         # Map CSV data to productos table
         print("\nProcessing data...")
-        productos = map_csv_to_products(df)
+        with stage('map products'):
+            productos = map_csv_to_products(df)
         print(f"Mapped {len(productos)} products")
         
         # Print sample of the data
@@ -185,12 +257,11 @@ def create_database(csv_file, db_name='productos.db'):
         
         # Write the data to the SQLite database
         print(f"\nImporting {len(productos)} records...")
-        productos.to_sql('productos', conn, if_exists='append', index=False)
-        
-        # Create indexes
-        with conn:
-            conn.execute('CREATE INDEX IF NOT EXISTS idx_codigo_barras ON productos(codigo_barras)')
-            conn.execute('CREATE INDEX IF NOT EXISTS idx_almacen ON productos(almacen)')
+        with stage('import'):
+            bulk_load(conn, 'productos', productos, indexes={
+                'idx_codigo_barras': ['codigo_barras'],
+                'idx_almacen': ['almacen'],
+            })
         
         # Print database info
         cursor = conn.cursor()
@@ -225,6 +296,7 @@ def main():
     parser.add_argument('csv_file', help='Path to the CSV file')
     parser.add_argument('--db', default='productos.db', 
                        help='Output database name (default: productos.db)')
+    add_profiling_arguments(parser)
     
     args = parser.parse_args()
     
@@ -232,10 +304,11 @@ def main():
         print(f"Error: File '{args.csv_file}' not found.")
         return 1
     
-    db_path = create_database(
-        csv_file=args.csv_file,
-        db_name=args.db
-    )
+    with profiled(args):
+        db_path = create_database(
+            csv_file=args.csv_file,
+            db_name=args.db
+        )
     
     if db_path:
         print(f"\nDatabase created successfully at: {os.path.abspath(db_path)}")
@@ -1,8 +1,14 @@
-import pandas as pd
 import os
-from openpyxl import load_workbook
-from openpyxl_image_loader import SheetImageLoader
-from PIL import Image
+import zipfile
+import xml.etree.ElementTree as ET
+
+from profiling import add_profiling_arguments, profiled, stage
+
+# pandas, openpyxl and openpyxl_image_loader (which pulls PIL) take most of the
+# start-up time, so they are only imported by the functions that need them
+
+WORKBOOK_XML = 'xl/workbook.xml'
+SPREADSHEET_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
 
 def filter_columns(df, columns_to_keep):
     """
@@ -48,6 +54,8 @@ def read_excel(file_path, sheet=0, header_line=0, column_names=None, extract_all
     Returns:
     - A pandas DataFrame with the Excel data
     """
+    import pandas as pd
+
     try:
         if extract_all_sheets:
             xls = pd.ExcelFile(file_path)
@@ -110,6 +118,9 @@ def extract_excel_sheet_images(file_path, sheet=0, output_folder='extracted_imag
     Returns:
     - List of paths to the saved images
     """
+    from openpyxl import load_workbook
+    from openpyxl_image_loader import SheetImageLoader
+
     try:
         if not os.path.exists(output_folder):
             os.makedirs(output_folder)
@@ -189,12 +200,21 @@ def save_excel(df, output_file_name):
 
 import argparse
 
+def read_sheet_names(file_path):
+    """
+    Read the sheet names of an .xlsx/.xlsm workbook, in tab order.
+
+    Only xl/workbook.xml is read from the zip, no cell is loaded.
+    """
+    with zipfile.ZipFile(file_path) as workbook_zip:
+        with workbook_zip.open(WORKBOOK_XML) as workbook_xml:
+            root = ET.parse(workbook_xml).getroot()
+    return [sheet.get('name') for sheet in root.iter(f'{SPREADSHEET_NS}sheet')]
+
 def list_sheets(file_path):
     """Displays all available sheets in the Excel file."""
     try:
-        # Use openpyxl to get sheet names
-        wb = load_workbook(file_path, read_only=True)
-        sheets = wb.sheetnames
+        sheets = read_sheet_names(file_path)
         print("\nAvailable sheets in the file:")
         for i, sheet in enumerate(sheets):
             print(f"{i}: {sheet}")
@@ -218,6 +238,7 @@ def parse_arguments():
                        help='Extract images from the Excel file')
     parser.add_argument('--listar_hojas', action='store_true',
                        help='Show the list of available sheets')
+    add_profiling_arguments(parser)
 
     return parser.parse_args()
 
@@ -225,42 +246,47 @@ def parse_arguments():
 if __name__ == "__main__":
     args = parse_arguments()
 
-    # Show list of sheets if requested
-    if args.listar_hojas:
-        list_sheets(args.archivo)
-        exit()
-
-    # Extract images with the provided arguments
-    if args.extract_images:
-        sheets = list_sheets(args.archivo)
-        for sheet in range(len(sheets)):
-            images = extract_excel_sheet_images(
-                file_path=args.archivo,
-                sheet=sheet,
-                output_folder=args.carpeta
-            )
-            print(f"\nTotal extracted images: {len(images)}")
-
-    data = read_excel(args.archivo, sheet=args.hoja, extract_all_sheets=args.extraer_todas_hojas)
-
-    if data is not None:
-        # Show available columns
-        print("\nAvailable columns in the data:")
-        print(data.columns.tolist())
-
-        # Specify the columns to keep
-        columns_to_keep = ['Codigo de Barras', 'Articulo', "Empaque", "Origen_Hoja"]
-
-        if columns_to_keep:
-            # Filter the columns
-            filtered_data = filter_columns(data, columns_to_keep)
-
-            if filtered_data is not None:
-                print("\nData after filtering columns (first 5 rows):")
-                print(filtered_data.head())
-                print(f"\nTotal rows: {len(filtered_data)}")
-
-                # Save the filtered data as CSV
-                output_name = 'datos_combinados.csv'
-                filtered_data.to_csv(output_name, index=False, encoding='utf-8-sig')
-                print(f"\nData saved to: {output_name}")
\ No newline at end of file
+    with profiled(args):
+        # Show list of sheets if requested
+        if args.listar_hojas:
+            with stage('list sheets'):
+                list_sheets(args.archivo)
+            exit()
+
+        # Extract images with the provided arguments
+        if args.extract_images:
+            sheets = list_sheets(args.archivo)
+            for sheet in range(len(sheets)):
+                with stage('extract images'):
+                    images = extract_excel_sheet_images(
+                        file_path=args.archivo,
+                        sheet=sheet,
+                        output_folder=args.carpeta
+                    )
+                print(f"\nTotal extracted images: {len(images)}")
+
+        with stage('read excel'):
+            data = read_excel(args.archivo, sheet=args.hoja, extract_all_sheets=args.extraer_todas_hojas)
+
+        if data is not None:
+            # Show available columns
+            print("\nAvailable columns in the data:")
+            print(data.columns.tolist())
+
+            # Specify the columns to keep
+            columns_to_keep = ['Codigo de Barras', 'Articulo', "Empaque", "Origen_Hoja"]
+
+            if columns_to_keep:
+                # Filter the columns
+                filtered_data = filter_columns(data, columns_to_keep)
+
+                if filtered_data is not None:
+                    print("\nData after filtering columns (first 5 rows):")
+                    print(filtered_data.head())
+                    print(f"\nTotal rows: {len(filtered_data)}")
+
+                    # Save the filtered data as CSV
+                    output_name = 'datos_combinados.csv'
+                    with stage('write csv'):
+                        filtered_data.to_csv(output_name, index=False, encoding='utf-8-sig')
+                    print(f"\nData saved to: {output_name}")
\ No newline at end of file
@@ -0,0 +1,242 @@
+"""
+Incremental build of the analysis outputs.
+
+Every output (the two clean csv files and the three figures) declares the
+files it is built from: the clean csv files are built from the OWID csv
+files, and the figures from the clean csv files they plot. The content hashes
+of those inputs, and of the output itself, are stored in a manifest together
+with the build parameters (year, float dtype) the output depends on; on the
+next run only the outputs whose inputs or parameters changed, whose inputs
+were rebuilt, or that are missing or were modified, are rebuilt, inputs first.
+
+Usage:
+    python build_analysis.py --dry_run
+    python build_analysis.py --output_dir report
+"""
+import argparse
+import os
+import time
+from graphlib import TopologicalSorter
+
+import matplotlib
+# must be selected before pyplot is imported by the analysis module
+matplotlib.use("Agg")
+
+import repo_root  # noqa: F401 (puts the repository root on sys.path)
+import hapinness_and_gdp_per_capita_analysis as analysis
+from build_manifest import code_paths, file_hash, load_manifest, save_manifest
+from owid_loader import INDICATORS
+from profiling import add_profiling_arguments, profiled, stage
+
+MANIFEST_NAME = ".build_manifest.json"
+# the build functions below are code the outputs depend on too
+CODE_INPUTS = code_paths(["build_analysis.py"])
+
+
+def analysis_nodes(data_dir=analysis.DATA_DIR, year=2021, output_dir=".",
+                   float_dtype=analysis.DEFAULT_FLOAT_DTYPE):
+    """
+    Declare the outputs of the analysis, the files and the build parameters each one depends on.
+
+    The figures are drawn from the same frames that are written to the clean
+    csv files, so they depend on those outputs rather than on the OWID files.
+
+    Returns:
+    - Dict output file name -> {"inputs": list of paths, "params": dict of build parameters,
+      "build": function(data, output_file)}
+    """
+    def sources(*keys):
+        return [os.path.join(data_dir, INDICATORS[key]["file"]) for key in keys] + CODE_INPUTS
+
+    def outputs(*names):
+        return [os.path.join(output_dir, name) for name in names] + CODE_INPUTS
+
+    happiness_sources = sources("gdp_per_capita", "healthcare", "happiness",
+                                "annual_expenditure_per_capita", "continents")
+    expenditure_sources = sources("expenditure", "continents")
+    expenditure_csv = "01_clean_expenditure_filtered.csv"
+    happiness_csv = "02_clean_happiness_annual_expenditure.csv"
+    # the expenditure csv covers every year, everything else is for the selected year
+    all_years_params = {"float_dtype": float_dtype}
+    year_params = {"year": year, "float_dtype": float_dtype}
+
+    return {
+        expenditure_csv: {
+            "inputs": expenditure_sources,
+            "params": all_years_params,
+            "build": lambda data, output_file: data["expenditure"].to_csv(output_file, index=False),
+        },
+        happiness_csv: {
+            "inputs": happiness_sources,
+            "params": year_params,
+            "build": lambda data, output_file: data["merged_happiness_annual_expenditure"].to_csv(output_file),
+        },
+        "01_happiness_vs_UHC_service_coverage_and_health_exp_per_capita.png": {
+            "inputs": outputs(happiness_csv),
+            "params": year_params,
+            "build": lambda data, output_file: analysis.create_scatter_plot_happiness_expenditure(
+                data["merged_happiness_annual_expenditure"], data["norm"], year=year,
+                output_file=output_file, show=False),
+        },
+        "02_Histogram_Health_Expenditure_per_Region_{}.png".format(year): {
+            # the bar colours come from the regional cantril averages
+            "inputs": outputs(expenditure_csv, happiness_csv),
+            "params": year_params,
+            "build": lambda data, output_file: analysis.create_histogram(
+                data["expenditure"], data["cantril_by_region"], data["norm"], year=year,
+                output_file=output_file, show=False),
+        },
+        "03_Health_Expenditure_per_Region.png": {
+            "inputs": outputs(expenditure_csv, happiness_csv),
+            "params": year_params,
+            "build": lambda data, output_file: analysis.create_bar_plot(
+                data["expenditure"], data["cantril_by_region"], data["norm"],
+                output_file=output_file, show=False),
+        },
+    }
+
+
+def stale_nodes(nodes, output_dir, manifest):
+    """
+    Work out which outputs need to be rebuilt, in dependency order.
+
+    An output is stale when it is missing, was modified since it was built,
+    it was built with other parameters, one of its inputs changed, or one of
+    its inputs is itself a stale output.
+
+    Returns:
+    - Dict output file name -> reason, ordered so inputs come before the outputs using them
+    """
+    output_paths = {os.path.abspath(os.path.join(output_dir, name)): name for name in nodes}
+    graph = {
+        name: [output_paths[os.path.abspath(path)] for path in node["inputs"]
+               if os.path.abspath(path) in output_paths]
+        for name, node in nodes.items()
+    }
+
+    hashes = {}
+
+    def cached_hash(path):
+        path = os.path.abspath(path)
+        if path not in hashes:
+            hashes[path] = file_hash(path)
+        return hashes[path]
+
+    stale = {}
+    for name in TopologicalSorter(graph).static_order():
+        node = nodes[name]
+        entry = manifest.get(name)
+        output_file = os.path.join(output_dir, name)
+        if entry is None:
+            stale[name] = "never built"
+        elif cached_hash(output_file) is None:
+            stale[name] = "output missing"
+        elif cached_hash(output_file) != entry.get("output"):
+            stale[name] = "output modified"
+        elif entry.get("params", {}) != node.get("params", {}):
+            recorded, params = entry.get("params", {}), node.get("params", {})
+            changed = sorted(key for key in set(recorded) | set(params) if recorded.get(key) != params.get(key))
+            stale[name] = "parameters changed: " + ", ".join(changed)
+        elif any(dependency in stale for dependency in graph[name]):
+            stale[name] = "input rebuilt"
+        else:
+            recorded = entry.get("inputs", {})
+            current = {os.path.abspath(path) for path in node["inputs"]}
+            changed = [path for path in current if recorded.get(path) != cached_hash(path)]
+            if changed or set(recorded) != current:
+                changed_names = sorted(os.path.basename(path) for path in changed) or ["input list"]
+                stale[name] = "changed: " + ", ".join(changed_names)
+    return stale
+
+
+def build(nodes, output_dir=".", data_loader=None, dry_run=False, force=False):
+    """
+    Rebuild the stale outputs and record their hashes.
+
+    Parameters:
+    - nodes: Output declarations (see analysis_nodes)
+    - output_dir: Folder where the outputs and the manifest are written
+    - data_loader: Function returning the data passed to the build functions,
+      only called if something has to be rebuilt
+    - dry_run: Only print what would be rebuilt
+    - force: Rebuild every output
+
+    Returns:
+    - Dict output file name -> build time in seconds (empty on a dry run)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest(output_dir, MANIFEST_NAME)
+    with stage("check inputs"):
+        stale = stale_nodes(nodes, output_dir, {} if force else manifest)
+
+    for name in nodes:
+        if name not in stale:
+            print(f"- {name}: up to date")
+        elif dry_run:
+            print(f"- {name}: would rebuild ({stale[name]})")
+    if dry_run or not stale:
+        return {}
+
+    start = time.perf_counter()
+    with stage("prepare data"):
+        data = data_loader() if data_loader is not None else None
+    print(f"Data prepared in {time.perf_counter() - start:.2f}s")
+
+    timings = {}
+    for name in stale:
+        node = nodes[name]
+        output_file = os.path.join(output_dir, name)
+        start = time.perf_counter()
+        with stage(name):
+            node["build"](data, output_file)
+        timings[name] = time.perf_counter() - start
+
+        manifest[name] = {
+            "inputs": {os.path.abspath(path): file_hash(path) for path in node["inputs"]},
+            "output": file_hash(output_file),
+            "params": node.get("params", {}),
+        }
+        save_manifest(output_dir, MANIFEST_NAME, manifest)
+        print(f"- {name}: rebuilt in {timings[name]:.2f}s ({stale[name]})")
+    return timings
+
+
+def parse_arguments():
+    """Configures and parses command line arguments."""
+    parser = argparse.ArgumentParser(description='Rebuild the analysis outputs whose inputs changed.')
+    parser.add_argument('--output_dir', type=str, default='.',
+                        help='Folder where the outputs are written (default: current folder)')
+    parser.add_argument('--data_dir', type=str, default=analysis.DATA_DIR,
+                        help='Folder containing the OWID csv files')
+    parser.add_argument('--year', type=int, default=2021,
+                        help='Year used for the happiness vs expenditure outputs')
+    parser.add_argument('--float_dtype', type=str, default=analysis.DEFAULT_FLOAT_DTYPE,
+                        choices=['float32', 'float64'],
+                        help='Precision of the indicator values (default: float32)')
+    parser.add_argument('--dry_run', action='store_true',
+                        help='Show what would be rebuilt without building anything')
+    parser.add_argument('--force', action='store_true',
+                        help='Rebuild every output')
+    add_profiling_arguments(parser)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    nodes = analysis_nodes(data_dir=args.data_dir, year=args.year, output_dir=args.output_dir,
+                           float_dtype=args.float_dtype)
+    with profiled(args):
+        timings = build(
+            nodes,
+            output_dir=args.output_dir,
+            data_loader=lambda: analysis.prepare_data(year=args.year, data_dir=args.data_dir,
+                                                      float_dtype=args.float_dtype),
+            dry_run=args.dry_run,
+            force=args.force,
+        )
+    if timings:
+        print(f"\nRebuilt {len(timings)} output(s) in {sum(timings.values()):.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Content hashes and manifests shared by the incremental builds of the analysis
+outputs (build_analysis.py for the clean csv files and figures, render_figures.py
+for the batch figures).
+
+A manifest is a json file stored next to the outputs, mapping every output
+file name to what it was built from; each build decides what goes in it.
+"""
+import hashlib
+import json
+import os
+
+CODE_DIR = os.path.dirname(os.path.abspath(__file__))
+# code the analysis outputs depend on, a change in any of them rebuilds everything
+CODE_FILES = ["hapinness_and_gdp_per_capita_analysis.py", "owid_loader.py", "label_placement.py"]
+
+
+def code_paths(extra=()):
+    """Paths of CODE_FILES plus the given file names of this folder"""
+    return [os.path.join(CODE_DIR, name) for name in CODE_FILES + list(extra)]
+
+
+def file_hash(file_path):
+    """sha256 of the file content, or None if the file does not exist"""
+    if not os.path.exists(file_path):
+        return None
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def code_hash(extra=()):
+    """sha256 of the content of CODE_FILES (plus the given file names), changes whenever that code does"""
+    digest = hashlib.sha256()
+    for path in code_paths(extra):
+        digest.update(os.path.basename(path).encode())
+        digest.update((file_hash(path) or "").encode())
+    return digest.hexdigest()
+
+
+def load_manifest(output_dir, manifest_name):
+    """Read the manifest of an output folder, empty if it is missing or unreadable"""
+    manifest_path = os.path.join(output_dir, manifest_name)
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"warning: ignoring unreadable manifest {manifest_path}: {e}")
+        return {}
+
+
+def save_manifest(output_dir, manifest_name, manifest):
+    with open(os.path.join(output_dir, manifest_name), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
@@ -1,4 +1,5 @@
-
+import argparse
+import os
 import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.ticker as mtick
@@ -8,47 +9,134 @@ import matplotlib.cm as cm
 import matplotlib.colors as mcolors
 import numpy
 
-gdp_per_capita = pd.read_csv("gdp-per-capita-worldbank.csv")     # DGP per capita
-happiness = pd.read_csv("happiness-cantril-ladder.csv")          # Happiness-cantril-ladder Score
-healthcare = pd.read_csv("healthcare-access-quality-un.csv")     # UHC service coverage index 
-expenditure = pd.read_csv("public-health-expenditure-share-gdp.csv") # Expenditure as % of the GDP
-annual_expenditure_per_capita = pd.read_csv("annual-healthcare-expenditure-per-capita.csv")
-
-continents= pd.read_csv("continents-according-to-our-world-in-data.csv") #list of countries per continent
-continents=  continents.drop(["Year", "Entity"], axis=1)
-
-# remove continents that do not have "Code" values (all codes have 3 characters)
-continents = continents[continents["Code"].str.len() == 3]
-healthcare = healthcare[healthcare["Code"].str.len() == 3]
-gdp_per_capita = gdp_per_capita[gdp_per_capita["Code"].str.len() == 3]
-expenditure = expenditure[expenditure["Code"].str.len() == 3]
-# Rename
-continents = continents.rename({"World regions according to OWID": "Region"}, axis=1)
-# rename GDP per capita in $
-gdp_per_capita = gdp_per_capita.rename({"GDP per capita, PPP (constant 2021 international $)": "GDP"}, axis=1)
-annual_expenditure_per_capita = annual_expenditure_per_capita.rename({"Current health expenditure per capita, PPP (current international $)": "PPP"}, axis=1)
-merged_gdp_health = pd.merge(gdp_per_capita, healthcare, on=["Code", "Year", "Entity"], how="inner")
-
-merged_gdp_health = pd.merge(merged_gdp_health, continents, on=["Code"], how="inner")
-annual_expenditure_per_capita = pd.merge(annual_expenditure_per_capita, continents, on=["Code"], how="inner")
-
-merged_gdp_happiness_health = pd.merge(merged_gdp_health, happiness, on=["Code", "Year", "Entity"], how="inner")
-
-# Filter for the year of interest
-# The latest available year in the combined DataFrame is 2021
-merged_gdp_happiness_health_2021 = merged_gdp_happiness_health[merged_gdp_happiness_health["Year"] == 2021]
-annual_expenditure_per_capita_2021 = annual_expenditure_per_capita[annual_expenditure_per_capita["Year"]==2021]
-
-merged_happiness_annual_expenditure = pd.merge(merged_gdp_happiness_health_2021, annual_expenditure_per_capita_2021, on=["Code", "Year", "Region", "Entity"], how="inner")
-
-# add region and colour to expenditure
-expenditure = pd.merge(expenditure, continents, on=["Code"], how="inner")
-expenditure.to_csv("01_clean_expenditure_filtered.csv", index=False)
-merged_happiness_annual_expenditure.to_csv("02_clean_happiness_annual_expenditure.csv")
-all_merged_data = merged_happiness_annual_expenditure
-happiness_df = merged_happiness_annual_expenditure
-regions = sorted(merged_happiness_annual_expenditure["Region"].unique())
-cantril_by_region = all_merged_data.groupby(["Region"])["Cantril ladder score"].mean().reset_index()
+import repo_root  # noqa: F401 (puts the repository root on sys.path)
+from label_placement import place_labels
+from owid_loader import DEFAULT_FLOAT_DTYPE, load_indicators
+from profiling import add_profiling_arguments, profiled, stage
+
+# folder holding the OWID csv files, so the module can be used from any working directory
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_merged_data(data_dir=DATA_DIR, float_dtype=DEFAULT_FLOAT_DTYPE):
+    """
+    Load the OWID csv files, drop the aggregate rows and merge them with the regions.
+
+    Parameters:
+    - data_dir: Folder containing the OWID csv files
+    - float_dtype: dtype of the indicator values (see owid_loader.read_owid_csv)
+
+    Returns:
+    - Tuple (merged gdp/happiness/health frame, annual expenditure per capita, expenditure share),
+      all of them covering every available year
+    """
+    # read, drop the aggregate rows and rename the value columns (see owid_loader.INDICATORS)
+    with stage("load indicators"):
+        indicators = load_indicators(data_dir=data_dir, float_dtype=float_dtype)
+    gdp_per_capita = indicators["gdp_per_capita"]     # DGP per capita
+    happiness = indicators["happiness"]          # Happiness-cantril-ladder Score
+    healthcare = indicators["healthcare"]     # UHC service coverage index 
+    expenditure = indicators["expenditure"] # Expenditure as % of the GDP
+    annual_expenditure_per_capita = indicators["annual_expenditure_per_capita"]
+    continents = indicators["continents"] #list of countries per continent
+
+    merged_gdp_health = pd.merge(gdp_per_capita, healthcare, on=["Code", "Year", "Entity"], how="inner")
+
+    merged_gdp_health = pd.merge(merged_gdp_health, continents, on=["Code"], how="inner")
+    annual_expenditure_per_capita = pd.merge(annual_expenditure_per_capita, continents, on=["Code"], how="inner")
+
+    merged_gdp_happiness_health = pd.merge(merged_gdp_health, happiness, on=["Code", "Year", "Entity"], how="inner")
+
+    # add region and colour to expenditure
+    expenditure = pd.merge(expenditure, continents, on=["Code"], how="inner")
+    return merged_gdp_happiness_health, annual_expenditure_per_capita, expenditure
+
+
+def prepare_data(year=2021, data_dir=DATA_DIR, float_dtype=DEFAULT_FLOAT_DTYPE):
+    """
+    Build the frames shared by every figure for a single year.
+
+    Parameters:
+    - year: Year used for the happiness vs expenditure comparison
+    - data_dir: Folder containing the OWID csv files
+    - float_dtype: dtype of the indicator values
+
+    Returns:
+    - A dict with the merged happiness/expenditure frame, the expenditure frame,
+      the average cantril score per region and the colour norm
+    """
+    merged_gdp_happiness_health, annual_expenditure_per_capita, expenditure = load_merged_data(data_dir, float_dtype)
+
+    # Filter for the year of interest
+    # The latest available year in the combined DataFrame is 2021
+    merged_gdp_happiness_health_year = merged_gdp_happiness_health[merged_gdp_happiness_health["Year"] == year]
+    annual_expenditure_per_capita_year = annual_expenditure_per_capita[annual_expenditure_per_capita["Year"]==year]
+
+    merged_happiness_annual_expenditure = pd.merge(merged_gdp_happiness_health_year, annual_expenditure_per_capita_year, on=["Code", "Year", "Region", "Entity"], how="inner")
+
+    cantril_by_region = merged_happiness_annual_expenditure.groupby(["Region"], observed=True)["Cantril ladder score"].mean().reset_index()
+    norm = mcolors.Normalize(vmin=merged_happiness_annual_expenditure['Cantril ladder score'].min(), vmax=merged_happiness_annual_expenditure['Cantril ladder score'].max())
+
+    return {
+        "merged_happiness_annual_expenditure": merged_happiness_annual_expenditure,
+        "expenditure": expenditure,
+        "cantril_by_region": cantril_by_region,
+        "norm": norm,
+    }
+
+
+def region_year_aggregates(merged_happiness_annual_expenditure, expenditure):
+    """
+    Mean cantril score, PPP, UHC index and expenditure share for every region and year.
+
+    Both frames are stacked and grouped once, so each mean only uses the countries
+    that report that indicator in that year.
+
+    Returns:
+    - DataFrame with one row per (Region, Year)
+    """
+    happiness_columns = ["Cantril ladder score", "PPP", "UHC service coverage index"]
+    stacked = pd.concat([
+        merged_happiness_annual_expenditure[["Region", "Year"] + happiness_columns],
+        expenditure[["Region", "Year", "Public health expenditure as a share of GDP"]],
+    ], ignore_index=True)
+    return stacked.groupby(["Region", "Year"], observed=True).mean().reset_index()
+
+
+def prepare_all_years_data(data_dir=DATA_DIR, float_dtype=DEFAULT_FLOAT_DTYPE):
+    """
+    Build the frames for every year at once, merged a single time.
+
+    Parameters:
+    - data_dir: Folder containing the OWID csv files
+    - float_dtype: dtype of the indicator values
+
+    Returns:
+    - A dict with the merged happiness/expenditure frame for all years, the expenditure frame,
+      the region x year aggregates, the years with happiness data and a colour norm shared by all years
+    """
+    merged_gdp_happiness_health, annual_expenditure_per_capita, expenditure = load_merged_data(data_dir, float_dtype)
+    merged_happiness_annual_expenditure = pd.merge(merged_gdp_happiness_health, annual_expenditure_per_capita, on=["Code", "Year", "Region", "Entity"], how="inner")
+
+    aggregates = region_year_aggregates(merged_happiness_annual_expenditure, expenditure)
+    # same colour scale for all the years so the figures can be compared side by side
+    norm = mcolors.Normalize(vmin=merged_happiness_annual_expenditure['Cantril ladder score'].min(), vmax=merged_happiness_annual_expenditure['Cantril ladder score'].max())
+
+    return {
+        "merged_happiness_annual_expenditure": merged_happiness_annual_expenditure,
+        "expenditure": expenditure,
+        "aggregates": aggregates,
+        "years": sorted(merged_happiness_annual_expenditure["Year"].unique()),
+        "norm": norm,
+    }
+
+
+def save_clean_data(data, output_dir="."):
+    """Write the cleaned frames used by the figures to csv"""
+    data["expenditure"].to_csv(os.path.join(output_dir, "01_clean_expenditure_filtered.csv"), index=False)
+    data["merged_happiness_annual_expenditure"].to_csv(os.path.join(output_dir, "02_clean_happiness_annual_expenditure.csv"))
+
+
 marker_per_region = {
     'Africa': 'o',
     'Asia': 's',
@@ -59,12 +147,26 @@ marker_per_region = {
 }
 
 cmap = cm.viridis
-norm = mcolors.Normalize(vmin=happiness_df['Cantril ladder score'].min(), vmax=happiness_df['Cantril ladder score'].max())
 
 
-def create_scatter_plot_happiness_expenditure():
+def create_scatter_plot_happiness_expenditure(all_merged_data, norm, year=2021,
+                                              output_file="01_happiness_vs_UHC_service_coverage_and_health_exp_per_capita.png",
+                                              show=True, regional_avg=None):
+    """
+    Scatter of health expenditure per capita vs UHC index, coloured by cantril score.
+
+    Parameters:
+    - all_merged_data: Merged happiness/expenditure frame for a single year
+    - norm: Colour norm for the cantril score
+    - year: Year shown in the title
+    - output_file: Path of the png to write
+    - show: If False the figure is closed after saving instead of shown
+    - regional_avg: Optional precomputed region means for this year (see region_year_aggregates),
+      used instead of averaging the rows of each region again
+    """
+    regions = sorted(all_merged_data["Region"].unique())
 
-    plt.figure(figsize=(12, 8))
+    fig = plt.figure(figsize=(12, 8))
 
     ax = plt.gca()  # Get current axes
 
@@ -96,6 +198,9 @@ def create_scatter_plot_happiness_expenditure():
 
     region_handles = []
     text_handles = []
+    # (x, y, country, colour) for every rule a country matches, placed together at the end
+    country_labels = []
+    points = []
     our_countries = ["Brazil", "Canada", "Chile", "Mexico", "Romania"]
 
     # We'll store one mappable object to use for the colorbar
@@ -130,7 +235,11 @@ def create_scatter_plot_happiness_expenditure():
             mappable = scatter
 
         # get the averages to do some comparisons with the data 
-        cantril_avg, ppp_avg, uhc_avg = get_regional_avg(regional_merged_data)
+        if regional_avg is not None:
+            avg = regional_avg[regional_avg["Region"] == region].iloc[0]
+            cantril_avg, ppp_avg, uhc_avg = avg["Cantril ladder score"], avg["PPP"], avg["UHC service coverage index"]
+        else:
+            cantril_avg, ppp_avg, uhc_avg = get_regional_avg(regional_merged_data)
         
         # adding some labels of countries we found interesting data from
         
@@ -141,44 +250,41 @@ def create_scatter_plot_happiness_expenditure():
             cantril = row["Cantril ladder score"]
     
             if numpy.isfinite(x) and numpy.isfinite(y):
-                offset = 140
-                yoffset = offset/200
-                # adjusting the states manually to be inside the figure
-                if country=="United States":
-                    offset = offset*-5
-                    yoffset += 1
+                # a missing score gives a NaN marker size, matplotlib does not draw that marker
+                if numpy.isfinite(cantril):
+                    points.append((x, y, cantril*15))
                 # get countries with best/worst self-assessed well-being 
                 if row["Cantril ladder score"]>7.5:
-                    plt.text(x+offset, y-yoffset, country, fontsize=8, c="g")
+                    country_labels.append((x, y, country, "g"))
                 if row["Cantril ladder score"]<3:
-                    plt.text(x+offset, y-yoffset, country, fontsize=8, c="b")
+                    country_labels.append((x, y, country, "b"))
                 # add the countries of the members of the team
                 if country in our_countries:
-                    plt.text(x+offset, y-yoffset, country, fontsize=8, c="black")
+                    country_labels.append((x, y, country, "black"))
                 # countries that stand out due to being higher than avg 
                 # adding multipliers so we show just the most extreme cases and avoid overlapping
                 if x>ppp_avg*4:
-                    plt.text(x+offset, y-yoffset, country, fontsize=8, c="m")
+                    country_labels.append((x, y, country, "m"))
                 if y>uhc_avg*1.5:
-                    plt.text(x+offset, y-yoffset, country, fontsize=8, c="m")
+                    country_labels.append((x, y, country, "m"))
                 if cantril>cantril_avg*1.4:
-                    plt.text(x+offset, y-yoffset, country, fontsize=8, c="m")
+                    country_labels.append((x, y, country, "m"))
                     
                 # countries that stand out due to being lower than avg 
 
                 if x*6<ppp_avg:
-                    plt.text(x+offset, y-yoffset, country, fontsize=8, c="tab:blue")
+                    country_labels.append((x, y, country, "tab:blue"))
                 if y*3<uhc_avg:
-                    plt.text(x+offset, y-yoffset, country, fontsize=8, c="tab:blue")
+                    country_labels.append((x, y, country, "tab:blue"))
                 if cantril*2.5<cantril_avg:
-                    plt.text(x+offset, y-yoffset, country, fontsize=8, c="tab:blue")
+                    country_labels.append((x, y, country, "tab:blue"))
                 # expenditure surprises 
                 # not a lot of expending and very high well-being rate
                 if x<5000 and cantril>7.1:
-                    plt.text(x+offset, y-yoffset, country, fontsize=8, c="tab:brown")
+                    country_labels.append((x, y, country, "tab:brown"))
                 # a lot of expending and less well-being 
                 if x>7000 and cantril<6:
-                    plt.text(x+offset, y-yoffset, country, fontsize=8, c="c")
+                    country_labels.append((x, y, country, "c"))
 
     # Create a mappable object for the colorbar
     sm = cm.ScalarMappable(cmap=cmap, norm=norm)
@@ -189,7 +295,7 @@ def create_scatter_plot_happiness_expenditure():
 
     plt.xlabel("Current health expenditure per capita, PPP (current international $)")
     plt.ylabel("UHC service coverage index")
-    plt.title("Happiness (Cantril Score) vs current health expenditure per capita. (Color = Score) in 2021")
+    plt.title("Happiness (Cantril Score) vs current health expenditure per capita. (Color = Score) in {}".format(year))
 
     # markers per region legend
     region_legend = ax.legend(handles=region_handles, title="Region", loc="lower right", labelspacing=1)
@@ -220,14 +326,32 @@ def create_scatter_plot_happiness_expenditure():
         text.set_color(color)
         text.set_size(8)
     plt.tight_layout()
-    plt.savefig("01_happiness_vs_UHC_service_coverage_and_health_exp_per_capita.png")
-    plt.show()
-
-def create_histogram():
-    """function to create a histogram with the given parameters"""
+    # one label per country, moved around its point so labels do not overlap
+    place_labels(ax, country_labels, points=points, fontsize=8)
+    plt.savefig(output_file)
+    _show_or_close(fig, show)
+
+def create_histogram(expenditure, cantril_by_region, norm, year=2021, output_file=None, show=True,
+                     mean_exp_GDP_by_region=None):
+    """
+    function to create a histogram with the given parameters
+
+    mean_exp_GDP_by_region can be given (Region and expenditure share columns) to skip
+    filtering and grouping the expenditure frame; expenditure is then not used.
+    """
     #histogram GDP expenditure per region
-    expenditure_2021 = expenditure[expenditure["Year"] == 2021]
-    mean_exp_GDP_by_region = expenditure_2021.groupby(["Region", "Year"])["Public health expenditure as a share of GDP"].mean().reset_index()
+    if output_file is None:
+        output_file = "02_Histogram_Health_Expenditure_per_Region_{}.png".format(year)
+    if mean_exp_GDP_by_region is None:
+        expenditure_year = expenditure[expenditure["Year"] == year]
+        mean_exp_GDP_by_region = expenditure_year.groupby(["Region", "Year"], observed=True)["Public health expenditure as a share of GDP"].mean().reset_index()
+    # keep bars and cantril labels aligned, some years miss a region in one of the indicators
+    mean_exp_GDP_by_region = pd.merge(
+        mean_exp_GDP_by_region[["Region", "Public health expenditure as a share of GDP"]],
+        cantril_by_region[["Region", "Cantril ladder score"]],
+        on="Region", how="inner"
+    ).dropna()
+    cantril_by_region = mean_exp_GDP_by_region
 
 
     # Create the bar plot with mapped colors
@@ -245,7 +369,7 @@ def create_histogram():
 
     ax.bar_label(bar, labels=cantril_scores, label_type='center', size=7)
 
-    plt.title("Public Health Expenditure as % of GDP by Region (2021)")
+    plt.title("Public Health Expenditure as % of GDP by Region ({})".format(year))
     plt.ylabel("Expenditure (% of GDP)")
 
     # Create a mappable object for the colorbar
@@ -259,11 +383,11 @@ def create_histogram():
     plt.tight_layout()
     # add grid for reference 
     plt.grid(axis='y', linestyle='--', alpha=0.7)
-    plt.savefig("02_Histogram_Health_Expenditure_per_Region_2021.png")
-    plt.show()
+    plt.savefig(output_file)
+    _show_or_close(fig, show)
 
 
-def create_bar_plot():
+def create_bar_plot(expenditure, cantril_by_region, norm, output_file="03_Health_Expenditure_per_Region.png", show=True):
     """function to create a bar plot with the given parameters"""
     #GDP expenditure per Region
 
@@ -278,7 +402,7 @@ def create_bar_plot():
         'South America': '-'
     }
 
-    mean_exp_by_region_year = expenditure.groupby(["Region", "Year"])["Public health expenditure as a share of GDP"].mean().reset_index()
+    mean_exp_by_region_year = expenditure.groupby(["Region", "Year"], observed=True)["Public health expenditure as a share of GDP"].mean().reset_index()
     mean_exp_by_region_1970 = mean_exp_by_region_year[mean_exp_by_region_year["Year"] > 1970]
 
     regions = mean_exp_by_region_year["Region"].unique()
@@ -308,17 +432,64 @@ def create_bar_plot():
     plt.tight_layout()
     # to display y-axis as percentages 
     plt.gca().yaxis.set_major_formatter(mtick.PercentFormatter()) 
-    plt.savefig("03_Health_Expenditure_per_Region.png")
-    plt.show()
-
-def create_scatter_plot():
-    """function to create a scatter plot with the given parameters"""
-    create_scatter_plot_happiness_expenditure()
+    plt.savefig(output_file)
+    _show_or_close(fig, show)
+
+def create_region_year_facets(aggregates, output_file="04_Region_Year_Facets.png", show=True):
+    """
+    Faceted view of the region x year aggregates, one panel per indicator.
+
+    Parameters:
+    - aggregates: Output of region_year_aggregates
+    - output_file: Path of the png to write
+    - show: If False the figure is closed after saving instead of shown
+    """
+    indicators = {
+        "Cantril ladder score": "Cantril Ladder Score",
+        "PPP": "Health expenditure per capita, PPP ($)",
+        "UHC service coverage index": "UHC service coverage index",
+        "Public health expenditure as a share of GDP": "Expenditure (% of GDP)",
+    }
+    fig, axes = plt.subplots(2, 2, figsize=(12, 8))
+    for ax, (column, label) in zip(axes.flat, indicators.items()):
+        for region, region_df in aggregates.groupby("Region", observed=True):
+            region_df = region_df.dropna(subset=[column])
+            ax.plot(region_df["Year"], region_df[column], label=region,
+                    marker=marker_per_region.get(region, ''), markersize=3)
+        ax.set_title(label, size=10)
+        ax.grid(True, linestyle='--', alpha=0.7)
+    axes.flat[-1].yaxis.set_major_formatter(mtick.PercentFormatter())
+    axes.flat[0].legend(title="Region", fontsize=8)
+    fig.suptitle("Regional averages per year")
+    plt.tight_layout()
+    plt.savefig(output_file)
+    _show_or_close(fig, show)
 
-def create_histogram():
-    """function to create a histogram with the given parameters"""
-    create_histogram()
+def _show_or_close(fig, show):
+    """Show the figure interactively, or release it when rendering in batch"""
+    if show:
+        plt.show()
+    else:
+        plt.close(fig)
 
-def create_bar_plot():
-    """function to create a bar plot with the given parameters"""
-    create_bar_plot()
\ No newline at end of file
+def create_scatter_plot(all_merged_data, norm, **kwargs):
+    """function to create a scatter plot with the given parameters"""
+    create_scatter_plot_happiness_expenditure(all_merged_data, norm, **kwargs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Happiness vs health expenditure analysis (2021).')
+    add_profiling_arguments(parser)
+    args = parser.parse_args()
+
+    with profiled(args):
+        with stage("prepare data"):
+            data = prepare_data()
+        with stage("save clean data"):
+            save_clean_data(data)
+        with stage("scatter plot"):
+            create_scatter_plot(data["merged_happiness_annual_expenditure"], data["norm"])
+        with stage("histogram"):
+            create_histogram(data["expenditure"], data["cantril_by_region"], data["norm"])
+        with stage("bar plot"):
+            create_bar_plot(data["expenditure"], data["cantril_by_region"], data["norm"])
@@ -0,0 +1,143 @@
+"""
+Label placement for the scatter annotations without overlapping labels.
+
+Each label is tried at a few positions around its point. A candidate is kept
+if its box stays inside the axes and does not hit a marker or a label placed
+before it. The boxes are stored in a uniform grid, so a candidate is only
+checked against the boxes in the cells it covers. That keeps placement close
+to linear in the number of labels, instead of checking every label against
+every other one.
+"""
+import math
+from collections import defaultdict
+
+# candidate offsets from the point, in points, with the text alignment that goes with them
+CANDIDATES = [
+    ((6, -2), "left", "top"),
+    ((6, 2), "left", "bottom"),
+    ((-6, -2), "right", "top"),
+    ((-6, 2), "right", "bottom"),
+    ((0, 8), "center", "bottom"),
+    ((0, -8), "center", "top"),
+    ((12, 0), "left", "center"),
+    ((-12, 0), "right", "center"),
+]
+# rough glyph size relative to the font size, good enough to detect overlaps
+CHAR_WIDTH = 0.6
+LINE_HEIGHT = 1.2
+
+
+class GridIndex:
+    """Uniform grid of axis-aligned boxes (x0, y0, x1, y1) in display coordinates."""
+
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.cells = defaultdict(list)
+
+    def _cells(self, box):
+        x0, y0, x1, y1 = box
+        size = self.cell_size
+        for i in range(int(x0 // size), int(x1 // size) + 1):
+            for j in range(int(y0 // size), int(y1 // size) + 1):
+                yield (i, j)
+
+    def insert(self, box):
+        for cell in self._cells(box):
+            self.cells[cell].append(box)
+
+    def intersects(self, box):
+        x0, y0, x1, y1 = box
+        for cell in self._cells(box):
+            for other in self.cells.get(cell, ()):
+                if x0 < other[2] and other[0] < x1 and y0 < other[3] and other[1] < y1:
+                    return True
+        return False
+
+
+def merge_labels(labels):
+    """
+    Keep a single label per text.
+
+    Parameters:
+    - labels: List of (x, y, text, color) in priority order
+
+    Returns:
+    - List of (x, y, text, color), the first color found for each text is kept
+    """
+    merged = {}
+    for x, y, text, color in labels:
+        if text not in merged:
+            merged[text] = (x, y, text, color)
+    return list(merged.values())
+
+
+def _text_box(anchor, offset, ha, va, width, height):
+    x = anchor[0] + offset[0]
+    y = anchor[1] + offset[1]
+    x0 = {"left": x, "right": x - width, "center": x - width / 2}[ha]
+    y0 = {"bottom": y, "top": y - height, "center": y - height / 2}[va]
+    return (x0, y0, x0 + width, y0 + height)
+
+
+def _inside(box, axes_box):
+    return (axes_box.x0 <= box[0] and box[2] <= axes_box.x1
+            and axes_box.y0 <= box[1] and box[3] <= axes_box.y1)
+
+
+def place_labels(ax, labels, points=(), fontsize=8):
+    """
+    Add the labels to the axes, moving them around their point to avoid overlaps.
+
+    Call it once the axes limits and layout are final (e.g. after tight_layout),
+    as the collision checks are done in display coordinates.
+
+    Parameters:
+    - ax: matplotlib Axes
+    - labels: List of (x, y, text, color) in data coordinates, in priority order;
+      duplicated texts are merged
+    - points: List of (x, y, marker size in points^2) of the plotted markers, kept free of labels;
+      points with a missing (NaN) position or size are not drawn by matplotlib and are ignored
+    - fontsize: Font size of the labels
+
+    Returns:
+    - List of the created matplotlib Text objects
+    """
+    # make sure the view limits are up to date before using transData
+    ax.get_xlim()
+    ax.get_ylim()
+    pixels_per_point = ax.figure.dpi / 72
+    transform = ax.transData.transform
+    axes_box = ax.get_window_extent()
+
+    height = fontsize * LINE_HEIGHT * pixels_per_point
+    index = GridIndex(cell_size=4 * height)
+
+    for x, y, size in points:
+        px, py = transform((x, y))
+        if not (math.isfinite(px) and math.isfinite(py) and math.isfinite(size)):
+            continue
+        radius = (size ** 0.5) / 2 * pixels_per_point
+        index.insert((px - radius, py - radius, px + radius, py + radius))
+
+    texts = []
+    for x, y, text, color in merge_labels(labels):
+        anchor = transform((x, y))
+        if not (math.isfinite(anchor[0]) and math.isfinite(anchor[1])):
+            continue
+        width = len(text) * fontsize * CHAR_WIDTH * pixels_per_point
+        candidates = [
+            (offset, ha, va, _text_box(anchor, (offset[0] * pixels_per_point, offset[1] * pixels_per_point),
+                                       ha, va, width, height))
+            for offset, ha, va in CANDIDATES
+        ]
+        inside = [candidate for candidate in candidates if _inside(candidate[3], axes_box)]
+        chosen = next((candidate for candidate in inside if not index.intersects(candidate[3])), None)
+        if chosen is None:
+            # nowhere free: keep the first position that stays inside the axes
+            chosen = (inside or candidates)[0]
+
+        offset, ha, va, box = chosen
+        index.insert(box)
+        texts.append(ax.annotate(text, (x, y), xytext=offset, textcoords="offset points",
+                                 ha=ha, va=va, fontsize=fontsize, color=color))
+    return texts
@@ -0,0 +1,213 @@
+"""
+Shared loader for the Our World in Data (OWID) indicator csv files.
+
+Every OWID grapher csv has the same layout: Entity, Code, Year and one or more
+value columns. Read with the default dtypes the repeated country names and
+codes become python strings and the numbers 64 bit, so the files are read
+here with categorical Entity and Code columns, a 16 bit Year and a
+configurable float precision for the registered value columns.
+
+The indicators used by the analysis are declared in INDICATORS; adding one is
+a single line. load_indicators() reads them concurrently, drops the aggregate
+rows (continents, income groups... that have no 3 letter code) and renames the
+value column in the same pass, and keeps them in a shared cache.
+"""
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy
+import pandas as pd
+
+DEFAULT_FLOAT_DTYPE = "float32"
+
+# key -> file, verbose OWID value column and the short name used in the analysis.
+# "dtype" overrides the float dtype of a value column that holds text,
+# "drop" lists columns that are not needed (the continents file is a single snapshot year)
+INDICATORS = {
+    "gdp_per_capita": {"file": "gdp-per-capita-worldbank.csv", "column": "GDP per capita, PPP (constant 2021 international $)", "name": "GDP"},
+    "happiness": {"file": "happiness-cantril-ladder.csv", "column": "Cantril ladder score", "name": "Cantril ladder score"},
+    "healthcare": {"file": "healthcare-access-quality-un.csv", "column": "UHC service coverage index", "name": "UHC service coverage index"},
+    "expenditure": {"file": "public-health-expenditure-share-gdp.csv", "column": "Public health expenditure as a share of GDP", "name": "Public health expenditure as a share of GDP"},
+    "annual_expenditure_per_capita": {"file": "annual-healthcare-expenditure-per-capita.csv", "column": "Current health expenditure per capita, PPP (current international $)", "name": "PPP"},
+    "continents": {"file": "continents-according-to-our-world-in-data.csv", "column": "World regions according to OWID", "name": "Region", "dtype": "category", "drop": ["Year", "Entity"]},
+}
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def compact_dtypes(file_path, value_dtypes=None):
+    """
+    Work out the compact dtype of the known columns of an OWID csv file.
+
+    Only Entity, Code, Year and the given value columns are forced; any other
+    column (e.g. a sparse annotation column) is left for pandas to infer, as
+    guessing its type from the first rows breaks when it only fills in later.
+
+    Parameters:
+    - file_path: Path to the csv file
+    - value_dtypes: Dict value column -> dtype
+
+    Returns:
+    - Dict column name -> dtype, usable as the dtype argument of pd.read_csv
+    """
+    value_dtypes = value_dtypes or {}
+    dtypes = {}
+    for column in pd.read_csv(file_path, nrows=0).columns:
+        if column == "Year":
+            dtypes[column] = "int16"
+        elif column in ("Entity", "Code"):
+            dtypes[column] = "category"
+        elif column in value_dtypes:
+            dtypes[column] = value_dtypes[column]
+    return dtypes
+
+
+def default_memory_usage(df):
+    """
+    Estimate the bytes the frame would use with the pandas default dtypes
+    (python strings for text, int64 and float64 for numbers).
+    """
+    total = df.index.memory_usage()
+    for column in df.columns:
+        series = df[column]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            # one pointer per row plus the string object it points to
+            sizes = numpy.array([sys.getsizeof(str(c)) for c in series.cat.categories] + [0])
+            total += 8 * len(series) + int(sizes[series.cat.codes.to_numpy()].sum())
+        else:
+            total += 8 * len(series)
+    return total
+
+
+def read_owid_csv(file_path, value_dtypes=None, verbose=True):
+    """
+    Read an OWID csv file with compact dtypes.
+
+    Parameters:
+    - file_path: Path to the csv file
+    - value_dtypes: Dict value column -> dtype ("float32", "float64", "category"...),
+      the other columns are inferred by pandas
+    - verbose: If True, print the memory used and saved against the default dtypes
+
+    Returns:
+    - A pandas DataFrame with categorical Entity/Code columns and an int16 Year
+    """
+    df = pd.read_csv(file_path, dtype=compact_dtypes(file_path, value_dtypes))
+    if verbose:
+        print(memory_report(file_path, df))
+    return df
+
+
+def memory_report(file_path, df):
+    """One line with the rows and memory of a frame, and the memory saved against the default dtypes"""
+    used = df.memory_usage(deep=True).sum()
+    default = default_memory_usage(df)
+    saved = default - used
+    return (f"Loaded {file_path}: {len(df)} rows, {used / 1024:.1f} KiB "
+            f"(saved {saved / 1024:.1f} KiB, {100 * saved / default:.0f}%)")
+
+
+def clean_indicator(df, indicator):
+    """
+    Keep the country rows of an indicator frame, drop the unused columns and rename its value column.
+
+    Parameters:
+    - df: Frame (or chunk) read from the indicator csv file
+    - indicator: Entry of INDICATORS
+
+    Returns:
+    - The cleaned DataFrame
+    """
+    # aggregate rows (World, continents, income groups...) have no code or an OWID_ one;
+    # on a categorical column the length is only computed once per distinct code
+    countries = df["Code"].str.len() == 3
+    df = df.loc[countries.fillna(False).astype(bool)]
+    df = df.drop(columns=indicator.get("drop", [])).rename(columns={indicator["column"]: indicator["name"]})
+    if isinstance(df["Code"].dtype, pd.CategoricalDtype):
+        df["Code"] = df["Code"].cat.remove_unused_categories()
+    return df
+
+
+def load_indicator(key, data_dir, float_dtype=DEFAULT_FLOAT_DTYPE, verbose=True):
+    """
+    Read one registered indicator, keeping only country rows and the short column name.
+
+    Parameters:
+    - key: Key of the indicator in INDICATORS
+    - data_dir: Folder containing the OWID csv files
+    - float_dtype: dtype used for the numeric value columns
+    - verbose: If True, print the memory used by the frame
+
+    Returns:
+    - A pandas DataFrame with compact dtypes
+    """
+    df, report = _read_indicator(key, data_dir, float_dtype)
+    if verbose:
+        print(report)
+    return df
+
+
+def _read_indicator(key, data_dir, float_dtype):
+    """Read and clean one indicator, returns the frame and the memory report of the file as read"""
+    indicator = INDICATORS[key]
+    file_path = os.path.join(data_dir, indicator["file"])
+    value_dtypes = {indicator["column"]: indicator.get("dtype", float_dtype)}
+    df = read_owid_csv(file_path, value_dtypes, verbose=False)
+    return clean_indicator(df, indicator), memory_report(file_path, df)
+
+
+def load_indicators(keys=None, data_dir=".", float_dtype=DEFAULT_FLOAT_DTYPE, verbose=True, workers=None):
+    """
+    Load several registered indicators concurrently, reusing the cached ones.
+
+    A cached frame is reused while its file is unchanged (same modification time),
+    so callers must not modify the returned frames in place.
+
+    Parameters:
+    - keys: Keys of the indicators to load (default: all of INDICATORS)
+    - data_dir: Folder containing the OWID csv files
+    - float_dtype: dtype used for the numeric value columns
+    - verbose: If True, print the memory used by every frame read from disk
+    - workers: Number of reading threads (default: one per CPU, at most one per file)
+
+    Returns:
+    - Dict key -> DataFrame
+    """
+    if keys is None:
+        keys = list(INDICATORS)
+
+    # one cache entry per file and dtype, replaced when the file changes
+    cache_keys = {key: (os.path.abspath(os.path.join(data_dir, INDICATORS[key]["file"])), float_dtype)
+                  for key in keys}
+    mtimes = {key: os.path.getmtime(cache_keys[key][0]) for key in keys}
+    frames = {}
+    with _cache_lock:
+        for key in keys:
+            mtime, df = _cache.get(cache_keys[key], (None, None))
+            if mtime == mtimes[key]:
+                frames[key] = df
+
+    missing = [key for key in keys if key not in frames]
+    if missing:
+        workers = workers or min(len(missing), os.cpu_count() or 4)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            loaded = executor.map(lambda key: _read_indicator(key, data_dir, float_dtype), missing)
+            for key, (df, report) in zip(missing, loaded):
+                frames[key] = df
+                # printed here rather than from the threads so the lines do not interleave
+                if verbose:
+                    print(report)
+        with _cache_lock:
+            for key in missing:
+                _cache[cache_keys[key]] = (mtimes[key], frames[key])
+
+    return {key: frames[key] for key in keys}
+
+
+def clear_cache():
+    """Forget every cached indicator frame"""
+    with _cache_lock:
+        _cache.clear()
@@ -0,0 +1,196 @@
+"""
+SQLite backed path for the happiness / health expenditure analysis.
+
+The registered OWID indicators (see owid_loader.INDICATORS) are streamed into
+an SQLite database with the bulk loader of csv_to_sqlite.py, one table per
+indicator with a unique (Code, Year) index. The joins and the region x year
+averages needed by the figures are then computed by SQLite, so only the
+query results are held in memory and the database is reused between runs:
+a table is only reloaded when its csv file changed.
+
+Usage:
+    python owid_sqlite.py --db owid.db
+"""
+import argparse
+import os
+import sqlite3
+
+import matplotlib.colors as mcolors
+import pandas as pd
+
+import repo_root  # noqa: F401 (puts the repository root on sys.path)
+from csv_to_sqlite import bulk_load
+from owid_loader import INDICATORS, clean_indicator
+from profiling import add_profiling_arguments, profiled, stage
+
+DEFAULT_CHUNKSIZE = 50000
+
+# countries with every indicator, same rows as the pandas merges of the analysis
+MERGED_VIEW_SQL = '''
+CREATE VIEW IF NOT EXISTS merged_happiness_annual_expenditure AS
+SELECT g.Entity, g.Code, g.Year, g.GDP, h."UHC service coverage index", c.Region,
+       hp."Cantril ladder score", a.PPP
+FROM gdp_per_capita g
+JOIN healthcare h ON h.Code = g.Code AND h.Year = g.Year AND h.Entity = g.Entity
+JOIN continents c ON c.Code = g.Code
+JOIN happiness hp ON hp.Code = g.Code AND hp.Year = g.Year AND hp.Entity = g.Entity
+JOIN annual_expenditure_per_capita a ON a.Code = g.Code AND a.Year = g.Year AND a.Entity = g.Entity
+'''
+
+# every mean only uses the countries that report that indicator in that year
+REGION_YEAR_AGGREGATES_SQL = '''
+SELECT Region, Year,
+       AVG(cantril) AS "Cantril ladder score",
+       AVG(ppp) AS PPP,
+       AVG(uhc) AS "UHC service coverage index",
+       AVG(share) AS "Public health expenditure as a share of GDP"
+FROM (
+    SELECT Region, Year, "Cantril ladder score" AS cantril, PPP AS ppp,
+           "UHC service coverage index" AS uhc, NULL AS share
+    FROM merged_happiness_annual_expenditure
+    UNION ALL
+    SELECT c.Region, e.Year, NULL, NULL, NULL, e."Public health expenditure as a share of GDP"
+    FROM expenditure e
+    JOIN continents c ON c.Code = e.Code
+)
+GROUP BY Region, Year
+ORDER BY Region, Year
+'''
+
+
+def build_database(db_path, data_dir=".", keys=None, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Load the registered indicators into an SQLite database, skipping unchanged files.
+
+    Parameters:
+    - db_path: Path of the SQLite database (created if missing)
+    - data_dir: Folder containing the OWID csv files
+    - keys: Keys of the indicators to load (default: all of INDICATORS)
+    - chunksize: Rows read from a csv file at a time
+
+    Returns:
+    - List of the tables that were (re)loaded
+    """
+    if keys is None:
+        keys = list(INDICATORS)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS _sources '
+                         '(table_name TEXT PRIMARY KEY, file TEXT, mtime REAL, size INTEGER)')
+
+        loaded = []
+        for key in keys:
+            indicator = INDICATORS[key]
+            file_path = os.path.abspath(os.path.join(data_dir, indicator["file"]))
+            stat = os.stat(file_path)
+            source = conn.execute('SELECT file, mtime, size FROM _sources WHERE table_name = ?', (key,)).fetchone()
+            if source == (file_path, stat.st_mtime, stat.st_size):
+                continue
+
+            print(f"Loading {indicator['file']} into table {key}...")
+            with conn:
+                conn.execute(f'DROP TABLE IF EXISTS "{key}"')
+            chunks = (
+                clean_indicator(chunk, indicator)
+                for chunk in pd.read_csv(file_path, chunksize=chunksize, dtype={"Entity": str, "Code": str})
+            )
+            # continents is a single snapshot year, one row per country
+            key_columns = ["Code"] if "Year" in indicator.get("drop", []) else ["Code", "Year"]
+            with stage(f"load {key}"):
+                row_count = bulk_load(conn, key, chunks, unique_indexes={f"idx_{key}_key": key_columns})
+            with conn:
+                conn.execute('INSERT OR REPLACE INTO _sources VALUES (?, ?, ?, ?)',
+                             (key, file_path, stat.st_mtime, stat.st_size))
+            print(f"- {row_count} rows")
+            loaded.append(key)
+
+        with conn:
+            conn.execute(MERGED_VIEW_SQL)
+        return loaded
+    finally:
+        conn.close()
+
+
+def query_region_year_aggregates(conn):
+    """Mean cantril score, PPP, UHC index and expenditure share per region and year"""
+    return pd.read_sql_query(REGION_YEAR_AGGREGATES_SQL, conn)
+
+
+def _norm(conn):
+    vmin, vmax = conn.execute('SELECT MIN("Cantril ladder score"), MAX("Cantril ladder score") '
+                              'FROM merged_happiness_annual_expenditure').fetchone()
+    return mcolors.Normalize(vmin=vmin, vmax=vmax)
+
+
+def prepare_data_sql(db_path, year=2021):
+    """
+    SQL counterpart of analysis.prepare_data.
+
+    The expenditure frame only holds the region x year averages (Region, Year and
+    expenditure share), which is all the histogram and the line plot use.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        merged = pd.read_sql_query('SELECT * FROM merged_happiness_annual_expenditure WHERE Year = ? '
+                                   'ORDER BY Entity', conn, params=(year,))
+        aggregates = query_region_year_aggregates(conn)
+        vmin, vmax = merged["Cantril ladder score"].min(), merged["Cantril ladder score"].max()
+    finally:
+        conn.close()
+
+    expenditure = aggregates[["Region", "Year", "Public health expenditure as a share of GDP"]].dropna()
+    cantril_by_region = aggregates.loc[aggregates["Year"] == year, ["Region", "Cantril ladder score"]].dropna()
+    return {
+        "merged_happiness_annual_expenditure": merged,
+        "expenditure": expenditure,
+        "cantril_by_region": cantril_by_region.reset_index(drop=True),
+        "norm": mcolors.Normalize(vmin=vmin, vmax=vmax),
+    }
+
+
+def prepare_all_years_data_sql(db_path):
+    """
+    SQL counterpart of analysis.prepare_all_years_data.
+
+    As in prepare_data_sql, the expenditure frame holds the region x year averages.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        merged = pd.read_sql_query('SELECT * FROM merged_happiness_annual_expenditure '
+                                   'ORDER BY Entity, Year', conn)
+        aggregates = query_region_year_aggregates(conn)
+        norm = _norm(conn)
+    finally:
+        conn.close()
+
+    return {
+        "merged_happiness_annual_expenditure": merged,
+        "expenditure": aggregates[["Region", "Year", "Public health expenditure as a share of GDP"]].dropna(),
+        "aggregates": aggregates,
+        "years": sorted(merged["Year"].unique()),
+        "norm": norm,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load the OWID csv files into an indexed SQLite database')
+    parser.add_argument('--db', default='owid.db',
+                        help='Output database name (default: owid.db)')
+    parser.add_argument('--data_dir', default=os.path.dirname(os.path.abspath(__file__)),
+                        help='Folder containing the OWID csv files')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE,
+                        help='Rows read from a csv file at a time')
+    add_profiling_arguments(parser)
+    args = parser.parse_args()
+
+    with profiled(args):
+        loaded = build_database(args.db, data_dir=args.data_dir, chunksize=args.chunksize)
+    if not loaded:
+        print("Database is up to date.")
+    print(f"\nDatabase ready at: {os.path.abspath(args.db)}")
+
+
+if __name__ == "__main__":
+    main()
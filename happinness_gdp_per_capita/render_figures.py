@@ -0,0 +1,236 @@
+"""
+Batch renderer for the happiness / health expenditure figures.
+
+Renders every figure with the non-interactive Agg backend in a process pool,
+from data that is prepared once and shared by all the figures. Figures whose
+inputs and plotting code did not change since the last run are skipped.
+
+With --all_years the region x year aggregates are computed in one grouped
+pass and a scatter and a bar figure are rendered for every year, plus a
+faceted view of the whole time series.
+
+With --db the csv files are loaded into (or reused from) an SQLite database
+and the joins and aggregates are computed there (see owid_sqlite.py).
+
+Usage:
+    python render_figures.py --output_dir figures --workers 4
+    python render_figures.py --output_dir figures --all_years
+    python render_figures.py --output_dir figures --all_years --db owid.db
+"""
+import argparse
+import hashlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+# must be selected before pyplot is imported by the analysis module
+matplotlib.use("Agg")
+
+import pandas as pd
+
+import repo_root  # noqa: F401 (puts the repository root on sys.path)
+import hapinness_and_gdp_per_capita_analysis as analysis
+import owid_sqlite
+from build_manifest import code_hash, load_manifest, save_manifest
+from profiling import add_profiling_arguments, profiled, stage
+
+MANIFEST_NAME = ".render_manifest.json"
+
+
+def figure_jobs(data, year=2021):
+    """
+    List the figures to render.
+
+    Returns:
+    - List of (output file name, plot function, keyword arguments) tuples
+    """
+    return [
+        ("01_happiness_vs_UHC_service_coverage_and_health_exp_per_capita.png",
+         analysis.create_scatter_plot_happiness_expenditure,
+         {"all_merged_data": data["merged_happiness_annual_expenditure"], "norm": data["norm"], "year": year}),
+        ("02_Histogram_Health_Expenditure_per_Region_{}.png".format(year),
+         analysis.create_histogram,
+         {"expenditure": data["expenditure"], "cantril_by_region": data["cantril_by_region"],
+          "norm": data["norm"], "year": year}),
+        ("03_Health_Expenditure_per_Region.png",
+         analysis.create_bar_plot,
+         {"expenditure": data["expenditure"], "cantril_by_region": data["cantril_by_region"], "norm": data["norm"]}),
+    ]
+
+
+def all_years_figure_jobs(data, reference_year=2021):
+    """
+    List the per-year figures built from the data of prepare_all_years_data.
+
+    Every year reuses the same merged frame and aggregates, split once by year.
+
+    Returns:
+    - List of (output file name, plot function, keyword arguments) tuples
+    """
+    aggregates = data["aggregates"]
+    norm = data["norm"]
+    merged_by_year = dict(tuple(data["merged_happiness_annual_expenditure"].groupby("Year")))
+    aggregates_by_year = dict(tuple(aggregates.groupby("Year")))
+
+    jobs = []
+    for year in data["years"]:
+        year_aggregates = aggregates_by_year[year]
+        jobs.append((
+            "01_happiness_vs_UHC_service_coverage_and_health_exp_per_capita_{}.png".format(year),
+            analysis.create_scatter_plot_happiness_expenditure,
+            {"all_merged_data": merged_by_year[year], "norm": norm, "year": year,
+             "regional_avg": year_aggregates},
+        ))
+        jobs.append((
+            "02_Histogram_Health_Expenditure_per_Region_{}.png".format(year),
+            analysis.create_histogram,
+            {"expenditure": None, "cantril_by_region": year_aggregates, "norm": norm, "year": year,
+             "mean_exp_GDP_by_region": year_aggregates},
+        ))
+
+    reference = aggregates_by_year.get(reference_year, aggregates_by_year[data["years"][-1]])
+    jobs.append((
+        "03_Health_Expenditure_per_Region.png",
+        analysis.create_bar_plot,
+        {"expenditure": data["expenditure"], "cantril_by_region": reference, "norm": norm},
+    ))
+    jobs.append((
+        "04_Region_Year_Facets.png",
+        analysis.create_region_year_facets,
+        {"aggregates": aggregates},
+    ))
+    return jobs
+
+
+def inputs_hash(func, kwargs, source_hash=""):
+    """Hash the plot function name, the source of the plotting code and every input it receives"""
+    digest = hashlib.sha256(func.__name__.encode())
+    digest.update(source_hash.encode())
+    for key in sorted(kwargs):
+        value = kwargs[key]
+        digest.update(key.encode())
+        if isinstance(value, pd.DataFrame):
+            digest.update(repr(list(value.columns)).encode())
+            digest.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+        elif hasattr(value, "vmin") and hasattr(value, "vmax"):
+            # matplotlib Normalize
+            digest.update(repr((value.vmin, value.vmax)).encode())
+        else:
+            digest.update(repr(value).encode())
+    return digest.hexdigest()
+
+
+def _render_figure(func, kwargs, output_file):
+    """Worker entry point: render a single figure and return the elapsed seconds"""
+    start = time.perf_counter()
+    func(output_file=output_file, show=False, **kwargs)
+    return time.perf_counter() - start
+
+
+def render_all(jobs, output_dir=".", workers=None, force=False):
+    """
+    Render the given figure jobs in a process pool.
+
+    Parameters:
+    - jobs: List of (output file name, plot function, keyword arguments)
+    - output_dir: Folder where the pngs and the manifest are written
+    - workers: Number of worker processes (default: one per CPU)
+    - force: Render every figure even if its inputs did not change
+
+    Returns:
+    - Dict mapping each rendered file name to its render time in seconds
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest(output_dir, MANIFEST_NAME)
+    # the analysis module and its helpers, so a change in the plotting code renders again
+    source_hash = code_hash()
+
+    pending = {}
+    for file_name, func, kwargs in jobs:
+        figure_hash = inputs_hash(func, kwargs, source_hash)
+        output_file = os.path.join(output_dir, file_name)
+        if not force and manifest.get(file_name) == figure_hash and os.path.exists(output_file):
+            print(f"- {file_name}: up to date, skipped")
+            continue
+        pending[file_name] = (func, kwargs, output_file, figure_hash)
+
+    timings = {}
+    if not pending:
+        return timings
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            file_name: executor.submit(_render_figure, func, kwargs, output_file)
+            for file_name, (func, kwargs, output_file, _) in pending.items()
+        }
+        for file_name, future in futures.items():
+            try:
+                timings[file_name] = future.result()
+            except Exception as e:
+                print(f"Error rendering {file_name}: {e}")
+                continue
+            manifest[file_name] = pending[file_name][3]
+            print(f"- {file_name}: rendered in {timings[file_name]:.2f}s")
+
+    save_manifest(output_dir, MANIFEST_NAME, manifest)
+    return timings
+
+
+def parse_arguments():
+    """Configures and parses command line arguments."""
+    parser = argparse.ArgumentParser(description='Render all the analysis figures without a display.')
+    parser.add_argument('--output_dir', type=str, default='.',
+                        help='Folder where the figures are written (default: current folder)')
+    parser.add_argument('--data_dir', type=str, default=analysis.DATA_DIR,
+                        help='Folder containing the OWID csv files')
+    parser.add_argument('--year', type=int, default=2021,
+                        help='Year used for the happiness vs expenditure figures')
+    parser.add_argument('--float_dtype', type=str, default=analysis.DEFAULT_FLOAT_DTYPE,
+                        choices=['float32', 'float64'],
+                        help='Precision of the indicator values (default: float32)')
+    parser.add_argument('--all_years', action='store_true',
+                        help='Render the figures for every available year')
+    parser.add_argument('--db', type=str, default=None,
+                        help='Compute the joins and aggregates in this SQLite database (created or refreshed as needed)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of worker processes (default: one per CPU)')
+    parser.add_argument('--force', action='store_true',
+                        help='Render every figure even if its inputs did not change')
+    add_profiling_arguments(parser)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+
+    # only the parent process is profiled, the figures render in the worker processes
+    with profiled(args):
+        start = time.perf_counter()
+        if args.db:
+            with stage("build database"):
+                owid_sqlite.build_database(args.db, data_dir=args.data_dir)
+
+        with stage("prepare data"):
+            if args.all_years:
+                if args.db:
+                    data = owid_sqlite.prepare_all_years_data_sql(args.db)
+                else:
+                    data = analysis.prepare_all_years_data(data_dir=args.data_dir, float_dtype=args.float_dtype)
+                jobs = all_years_figure_jobs(data, reference_year=args.year)
+            else:
+                if args.db:
+                    data = owid_sqlite.prepare_data_sql(args.db, year=args.year)
+                else:
+                    data = analysis.prepare_data(year=args.year, data_dir=args.data_dir, float_dtype=args.float_dtype)
+                jobs = figure_jobs(data, year=args.year)
+        print(f"Data prepared in {time.perf_counter() - start:.2f}s")
+
+        with stage("render"):
+            timings = render_all(jobs, output_dir=args.output_dir,
+                                 workers=args.workers, force=args.force)
+        print(f"\nRendered {len(timings)} figure(s) in {time.perf_counter() - start:.2f}s total")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+"""
+Puts the root of the repository on sys.path.
+
+The tools shared with the rest of the repository (profiling.py,
+csv_to_sqlite.py) live at its root. Every module of this folder that uses
+them imports this one first, explicitly:
+
+    import repo_root  # noqa: F401 (puts the repository root on sys.path)
+    from profiling import add_profiling_arguments, profiled, stage
+"""
+import os
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
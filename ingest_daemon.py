@@ -0,0 +1,304 @@
+"""
+Resident ingest service for the supplier workbooks.
+
+Watches a drop folder and loads every new workbook (or csv) into the
+productos database, without paying the start-up cost of running
+extract_excel_data.py and csv_to_sqlite.py for each file:
+
+- the folder is polled, and a file is picked up once its size and
+  modification time stopped changing (the supplier finished copying it);
+- a pool of worker threads reads and maps the files (read_excel +
+  map_csv_to_products);
+- a single writer thread keeps one SQLite connection open and upserts the
+  mapped products, so files never wait on each other's connections. Every
+  file gets a sequence number in arrival (modification time) order and the
+  writer applies them in that order, so a newer file always wins over an
+  older one sharing a product code, whichever worker finishes first;
+- processed files are moved to processed/ (or failed/) inside the drop folder;
+- queue depth and throughput are logged every few seconds and, optionally,
+  written to a json file.
+
+Usage:
+    python ingest_daemon.py --carpeta entrada --db productos.db
+"""
+import argparse
+import json
+import os
+import queue
+import shutil
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from csv_to_sqlite import ensure_tables, map_csv_to_products, upsert_products
+from extract_excel_data import read_excel
+from profiling import add_profiling_arguments, profiled, stage
+
+EXTENSIONS = ('.xlsx', '.xlsm', '.xls', '.csv')
+PROCESSED_FOLDER = 'processed'
+FAILED_FOLDER = 'failed'
+
+
+class IngestService:
+    """Polls a drop folder and loads the files it finds into the productos table."""
+
+    def __init__(self, drop_folder, db_path, workers=2, interval=2.0, stats_file=None):
+        self.drop_folder = drop_folder
+        self.db_path = db_path
+        self.interval = interval
+        self.stats_file = stats_file
+
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ingest-worker')
+        self.write_queue = queue.Queue()
+        self.writer = threading.Thread(target=self._writer_loop, name='ingest-writer', daemon=True)
+        # set once the writer opened the database (or failed to), writer_error holds why it stopped
+        self.writer_ready = threading.Event()
+        self.writer_error = None
+        self.stop_event = threading.Event()
+
+        # path -> (size, mtime) seen on the previous poll, to wait until a copy is finished
+        self.candidates = {}
+        # files handed to the workers and not yet written or failed
+        self.in_flight = set()
+        self.lock = threading.Lock()
+        # sequence number of the next queued file, and of the next one the writer applies
+        self.next_sequence = 0
+        self.next_to_write = 0
+        # sequence -> result finished by a worker before the files queued ahead of it (writer only)
+        self.held_results = {}
+
+        self.started_at = None
+        self.files_done = 0
+        self.files_failed = 0
+        self.rows_written = 0
+
+        for folder in (PROCESSED_FOLDER, FAILED_FOLDER):
+            os.makedirs(os.path.join(drop_folder, folder), exist_ok=True)
+
+    # --- stats -------------------------------------------------------------
+
+    def stats(self):
+        """Current queue depth and throughput counters"""
+        with self.lock:
+            in_flight = len(self.in_flight)
+            files_done, files_failed, rows_written = self.files_done, self.files_failed, self.rows_written
+        uptime = time.monotonic() - self.started_at if self.started_at else 0.0
+        return {
+            'queue_depth': in_flight,
+            'waiting_for_writer': self.write_queue.qsize() + len(self.held_results),
+            'files_done': files_done,
+            'files_failed': files_failed,
+            'rows_written': rows_written,
+            'uptime_seconds': round(uptime, 1),
+            'files_per_minute': round(60 * files_done / uptime, 2) if uptime else 0.0,
+            'rows_per_second': round(rows_written / uptime, 1) if uptime else 0.0,
+        }
+
+    def report_stats(self):
+        stats = self.stats()
+        print(f"[stats] queue: {stats['queue_depth']} ({stats['waiting_for_writer']} waiting for the writer), "
+              f"done: {stats['files_done']}, failed: {stats['files_failed']}, rows: {stats['rows_written']}, "
+              f"{stats['files_per_minute']} files/min, {stats['rows_per_second']} rows/s")
+        if self.stats_file:
+            tmp_file = self.stats_file + '.tmp'
+            with open(tmp_file, 'w') as f:
+                json.dump(stats, f, indent=2)
+            os.replace(tmp_file, self.stats_file)
+
+    # --- pipeline ------------------------------------------------------------
+
+    def poll(self):
+        """Queue the files of the drop folder whose copy is finished. Returns how many were queued."""
+        ready = []
+        seen = {}
+        for name in sorted(os.listdir(self.drop_folder)):
+            path = os.path.join(self.drop_folder, name)
+            if not name.lower().endswith(EXTENSIONS) or name.startswith(('.', '~$')) or not os.path.isfile(path):
+                continue
+            with self.lock:
+                if path in self.in_flight:
+                    continue
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            signature = (stat.st_size, stat.st_mtime)
+            seen[path] = signature
+            if self.candidates.get(path) == signature:
+                ready.append((stat.st_mtime, name, path))
+
+        # oldest first, so the writer applies the files in the order they arrived
+        for _, _, path in sorted(ready):
+            with self.lock:
+                self.in_flight.add(path)
+            self.executor.submit(self._read_and_map, self.next_sequence, path)
+            self.next_sequence += 1
+        # files that were queued (or vanished) are not candidates anymore
+        self.candidates = {path: sig for path, sig in seen.items() if path not in self.in_flight}
+        return len(ready)
+
+    def _read_and_map(self, sequence, path):
+        """Worker: read a file and map it to the productos columns, then hand it to the writer"""
+        try:
+            with stage('read'):
+                if path.lower().endswith('.csv'):
+                    df = pd.read_csv(path)
+                else:
+                    df = read_excel(path, extract_all_sheets=True)
+            if df is None:
+                raise ValueError('the file could not be read')
+            with stage('map'):
+                productos = map_csv_to_products(df)
+            self.write_queue.put((sequence, path, productos, None))
+        except Exception as e:
+            # failed files go through the writer too, so the sequence keeps advancing
+            self.write_queue.put((sequence, path, None, e))
+
+    def _writer_loop(self):
+        """Writer: the only thread touching the database, through one long-lived connection"""
+        conn = None
+        try:
+            conn = sqlite3.connect(self.db_path)
+            conn.execute('PRAGMA journal_mode=WAL')
+            ensure_tables(conn)
+            self.writer_ready.set()
+            while True:
+                item = self.write_queue.get()
+                if item is None:
+                    break
+                self.held_results[item[0]] = item[1:]
+                # apply every result whose predecessors are all written
+                while self.next_to_write in self.held_results:
+                    path, productos, error = self.held_results.pop(self.next_to_write)
+                    self.next_to_write += 1
+                    if error is not None:
+                        self._finish(path, error=error)
+                        continue
+                    try:
+                        with stage('upsert'):
+                            rows = upsert_products(conn, productos)
+                    except Exception as e:
+                        self._finish(path, error=e)
+                    else:
+                        self._finish(path, rows=rows)
+        except Exception as e:
+            # run() notices the writer is gone and stops the service
+            self.writer_error = e
+        finally:
+            self.writer_ready.set()
+            if conn is not None:
+                conn.close()
+
+    def _finish(self, path, rows=0, error=None):
+        folder = FAILED_FOLDER if error is not None else PROCESSED_FOLDER
+        target = os.path.join(self.drop_folder, folder, os.path.basename(path))
+        if os.path.exists(target):
+            base_name, ext = os.path.splitext(target)
+            target = f"{base_name}_{time.strftime('%Y%m%d%H%M%S')}{ext}"
+        try:
+            shutil.move(path, target)
+        except OSError as e:
+            print(f"Error moving {path}: {e}")
+
+        with self.lock:
+            self.in_flight.discard(path)
+            if error is not None:
+                self.files_failed += 1
+            else:
+                self.files_done += 1
+                self.rows_written += rows
+        if error is not None:
+            print(f"Error ingesting {os.path.basename(path)}: {error}")
+        else:
+            print(f"Ingested {os.path.basename(path)}: {rows} products")
+
+    # --- lifecycle -------------------------------------------------------------
+
+    def idle(self):
+        with self.lock:
+            return not self.in_flight and self.write_queue.empty()
+
+    def run(self, once=False, stats_interval=10.0):
+        """
+        Poll the drop folder until stopped (Ctrl+C) or the database writer fails.
+
+        Files that were not written when the writer fails stay in the drop
+        folder, so they are picked up again on the next start.
+
+        Parameters:
+        - once: Process the files already in the folder and return
+        - stats_interval: Seconds between two stats reports
+
+        Returns:
+        - False if the service stopped because the database writer failed, True otherwise
+        """
+        self.started_at = time.monotonic()
+        self.writer.start()
+        self.writer_ready.wait()
+        if self.writer.is_alive():
+            print(f"Watching {os.path.abspath(self.drop_folder)} (every {self.interval}s), writing to {self.db_path}")
+        last_report = time.monotonic()
+        try:
+            while not self.stop_event.is_set():
+                if not self.writer.is_alive():
+                    print(f"Error: the database writer for {self.db_path} stopped: {self.writer_error}")
+                    return False
+                self.poll()
+                if once and not self.candidates and self.idle():
+                    break
+                if time.monotonic() - last_report >= stats_interval:
+                    self.report_stats()
+                    last_report = time.monotonic()
+                self.stop_event.wait(self.interval)
+        except KeyboardInterrupt:
+            print("\nStopping, finishing the files already queued...")
+        finally:
+            self.stop()
+        return True
+
+    def stop(self):
+        self.stop_event.set()
+        self.executor.shutdown(wait=True)
+        if self.writer.is_alive():
+            self.write_queue.put(None)
+            self.writer.join()
+        self.report_stats()
+
+
+def parse_arguments():
+    """Configures and parses command line arguments."""
+    parser = argparse.ArgumentParser(description='Watch a folder and load the workbooks dropped in it into SQLite.')
+    parser.add_argument('--carpeta', type=str, required=True,
+                        help='Drop folder to watch')
+    parser.add_argument('--db', type=str, default='productos.db',
+                        help='Database to upsert into (default: productos.db, created if missing)')
+    parser.add_argument('--workers', type=int, default=2,
+                        help='Threads reading and mapping files (default: 2)')
+    parser.add_argument('--interval', type=float, default=2.0,
+                        help='Seconds between two polls of the folder (default: 2)')
+    parser.add_argument('--stats_interval', type=float, default=10.0,
+                        help='Seconds between two stats reports (default: 10)')
+    parser.add_argument('--stats_file', type=str, default=None,
+                        help='Also write the stats to this json file')
+    parser.add_argument('--once', action='store_true',
+                        help='Process the files already in the folder and exit')
+    add_profiling_arguments(parser)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+
+    if not os.path.isdir(args.carpeta):
+        print(f"Error: Folder '{args.carpeta}' not found.")
+        exit(1)
+
+    service = IngestService(args.carpeta, args.db, workers=args.workers,
+                            interval=args.interval, stats_file=args.stats_file)
+    with profiled(args):
+        ok = service.run(once=args.once, stats_interval=args.stats_interval)
+    if not ok:
+        exit(1)
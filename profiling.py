@@ -0,0 +1,138 @@
+"""
+Shared profiling switch for the command line scripts.
+
+Every script adds the options with add_profiling_arguments() and wraps its
+work in profiled(args):
+
+    parser = argparse.ArgumentParser(...)
+    add_profiling_arguments(parser)
+    args = parser.parse_args()
+    with profiled(args):
+        with stage("read"):
+            ...
+
+--profile runs the work under cProfile and prints the top functions
+(optionally dumping the pstats file), --trace_memory prints the allocation
+sites that grew the most between the start and the end, and --time_stages
+prints the wall-clock time of every stage(). With none of them, profiled()
+and stage() do nothing.
+"""
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+_NO_OP = nullcontext()
+# stage name -> accumulated seconds, None when stage timing is off
+_stage_times = None
+# stages can be timed from several threads at once (e.g. the ingest workers)
+_stage_lock = threading.Lock()
+
+
+def add_profiling_arguments(parser):
+    """Add the profiling options to an argparse parser."""
+    group = parser.add_argument_group('profiling')
+    group.add_argument('--profile', action='store_true',
+                       help='Run under cProfile and print the top functions')
+    group.add_argument('--profile_sort', default='cumulative',
+                       help='pstats sort key for the report (default: cumulative)')
+    group.add_argument('--profile_top', type=int, default=20,
+                       help='Number of functions / allocation sites reported (default: 20)')
+    group.add_argument('--profile_dump', default=None,
+                       help='Write the pstats data to this file (open with snakeviz, pstats...)')
+    group.add_argument('--trace_memory', action='store_true',
+                       help='Report the allocation sites that grew the most (tracemalloc)')
+    group.add_argument('--time_stages', action='store_true',
+                       help='Print the wall-clock time of every stage')
+    return parser
+
+
+def stage(name):
+    """
+    Context manager timing a named stage of the run.
+
+    Times add up if the same stage is entered several times, including from
+    several threads. Returns a shared no-op context when stage timing is off.
+    """
+    if _stage_times is None:
+        return _NO_OP
+    return _timed_stage(name)
+
+
+@contextmanager
+def _timed_stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _stage_lock:
+            _stage_times[name] = _stage_times.get(name, 0.0) + elapsed
+
+
+def _print_stage_report(total):
+    print("\nWall-clock time per stage:")
+    width = max((len(name) for name in _stage_times), default=0)
+    for name, seconds in _stage_times.items():
+        print(f"- {name:<{width}}  {seconds:8.3f}s  {100 * seconds / total if total else 0:5.1f}%")
+    print(f"- {'total':<{width}}  {total:8.3f}s")
+
+
+def _print_memory_report(before, after, top):
+    import tracemalloc
+
+    print(f"\nTop {top} allocation sites (tracemalloc, growth during the run):")
+    for stat in after.compare_to(before, 'lineno')[:top]:
+        print(f"- {stat}")
+    current, peak = tracemalloc.get_traced_memory()
+    print(f"Traced memory: current {current / 1024 / 1024:.1f} MiB, peak {peak / 1024 / 1024:.1f} MiB")
+
+
+@contextmanager
+def profiled(args):
+    """
+    Run the enclosed block with the profiling requested on the command line.
+
+    Parameters:
+    - args: Parsed arguments from a parser set up with add_profiling_arguments
+    """
+    global _stage_times
+
+    if not (args.profile or args.trace_memory or args.time_stages):
+        yield
+        return
+
+    # imported here so that scripts run without profiling do not pay for them
+    import cProfile
+    import pstats
+    import tracemalloc
+
+    profiler = cProfile.Profile() if args.profile else None
+    if args.trace_memory:
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+    if args.time_stages:
+        _stage_times = {}
+
+    start = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        total = time.perf_counter() - start
+
+        if args.time_stages:
+            _print_stage_report(total)
+            _stage_times = None
+        if args.trace_memory:
+            _print_memory_report(before, tracemalloc.take_snapshot(), args.profile_top)
+            tracemalloc.stop()
+        if profiler is not None:
+            print(f"\ncProfile, top {args.profile_top} by {args.profile_sort}:")
+            stats = pstats.Stats(profiler)
+            stats.sort_stats(args.profile_sort).print_stats(args.profile_top)
+            if args.profile_dump:
+                stats.dump_stats(args.profile_dump)
+                print(f"Profile data saved to: {args.profile_dump}")